@@ -19,8 +19,23 @@ from __future__ import absolute_import, division, print_function
 # 3rd party
 import numpy as np
 import warnings
-from scipy.interpolate import interp1d
-from scipy.signal import welch
+from functools import lru_cache
+from joblib import Parallel, delayed
+from scipy.interpolate import interp1d, CubicSpline
+from scipy.signal import welch, detrend
+
+try:
+    from numba import njit, prange, get_num_threads
+except ImportError:
+    njit = None
+
+try:
+    import pyfftw
+    from scipy.fft import set_backend
+except ImportError:
+    pyfftw = None
+else:
+    pyfftw.interfaces.cache.enable()
 
 # local
 from .. import utils
@@ -66,9 +81,13 @@ def hrv(rpeaks=None, sampling_rate=1000., rri=None, parameters='auto',
         the RR-interval sequence
         is cut at the outliers. If None, no correction is performed. Default:
         'interpolate'.
-    detrend_rri : bool, optional
-        Whether to detrend the RRI sequence with the default method smoothness
-        priors. Default: True.
+    detrend_rri : bool, str, optional
+        Whether to detrend the RRI sequence, and with which method. If True
+        (or any other truthy non-string value) or 'spa' uses smoothness
+        priors. If 'linear' removes the least-squares linear fit, which is
+        much cheaper and often enough for the frequency-domain ratios, but
+        less accurate for slow trends.
+        Default: True.
     features_only : bool, optional
         Whether to return only the hrv features. Default: True.
     show : bool, optional
@@ -103,7 +122,7 @@ def hrv(rpeaks=None, sampling_rate=1000., rri=None, parameters='auto',
 
     # initialize outputs
     out = utils.ReturnTuple((), ())
-    hrv_td, hrv_fd, hrv_nl = None, None, None
+    hrv_out = {}
 
     # compute RRIs
     if rri is None:
@@ -111,6 +130,9 @@ def hrv(rpeaks=None, sampling_rate=1000., rri=None, parameters='auto',
         rri = compute_rri(rpeaks=rpeaks, sampling_rate=sampling_rate,
                           filter_rri=False)
 
+    # ensure input format
+    rri = _as_rri(rri)
+
     # compute duration
     duration = np.sum(rri) / 1000.  # seconds
 
@@ -127,7 +149,7 @@ def hrv(rpeaks=None, sampling_rate=1000., rri=None, parameters='auto',
 
     # detrend rri sequence
     if detrend_rri:
-        rri_det, rri_trend = detrend_window(rri)
+        rri_det, rri_trend = detrend_window(rri, method=detrend_rri)
         # add to output
         out = out.append([rri_det, rri_trend], ['rri_det', 'rri_trend'])
     else:
@@ -142,58 +164,31 @@ def hrv(rpeaks=None, sampling_rate=1000., rri=None, parameters='auto',
     if parameters == 'all':
         duration = np.inf
 
-    # compute time-domain features
-    if parameters in ['time', 'auto', 'all']:
-        try:
-            hrv_td = hrv_timedomain(rri=rri,
-                                    duration=duration,
-                                    detrend_rri=detrend_rri,
-                                    show=show_individual,
-                                    rri_detrended=rri_det)
-            out = out.join(hrv_td)
-
-        except ValueError as e:
-            print('WARNING: Time-domain features not computed. Check input.')
-            print(e)
-
-            pass
-
-    # compute frequency-domain features
-    if parameters in ['frequency', 'auto', 'all']:
+    # compute the features of each selected domain
+    for domain, func, name in _domain_pipeline(parameters):
         try:
-            hrv_fd = hrv_frequencydomain(rri=rri,
-                                         duration=duration,
-                                         detrend_rri=detrend_rri,
-                                         show=show_individual,
-                                         fbands=kwargs.get('fbands', None))
-            out = out.join(hrv_fd)
-        except ValueError as e:
-            print('WARNING: Frequency-domain features not computed. Check input.')
-            print(e)
-            pass
+            domain_out = func(rri=rri,
+                              duration=duration,
+                              detrend_rri=detrend_rri,
+                              show=show_individual,
+                              rri_detrended=rri_det,
+                              fbands=kwargs.get('fbands', None))
+            hrv_out[domain] = domain_out
+            out = out.join(domain_out)
 
-    # compute non-linear features
-    if parameters in ['non-linear', 'auto', 'all']:
-        try:
-            hrv_nl = hrv_nonlinear(rri=rri,
-                                   duration=duration,
-                                   detrend_rri=detrend_rri,
-                                   show=show_individual)
-            out = out.join(hrv_nl)
-                
         except ValueError as e:
-            print('WARNING: Non-linear features not computed. Check input.')
+            print(f'WARNING: {name} features not computed. Check input.')
             print(e)
             pass
 
     # plot summary
     if show:
-        if hrv_td is not None and hrv_fd is not None and hrv_nl is not None:
+        if len(hrv_out) == 3:
             plotting.plot_hrv(rri=rri,
                               rri_trend=rri_trend,
-                              td_out=hrv_td,
-                              nl_out=hrv_nl,
-                              fd_out=hrv_fd,
+                              td_out=hrv_out['time'],
+                              nl_out=hrv_out['non-linear'],
+                              fd_out=hrv_out['frequency'],
                               show=True,
                               )
         else:
@@ -214,6 +209,48 @@ def hrv(rpeaks=None, sampling_rate=1000., rri=None, parameters='auto',
     return out
 
 
+@lru_cache(maxsize=None)
+def _domain_pipeline(parameters):
+    """Selects the HRV feature functions to compute for the given parameters
+    option.
+
+    Parameters
+    ----------
+    parameters : str
+        Option of the hrv function ('auto', 'time', 'frequency', 'non-linear'
+        or 'all').
+
+    Returns
+    -------
+    pipeline : tuple
+        (domain, function, name) of each feature domain to compute.
+    """
+
+    domains = (('time', hrv_timedomain, 'Time-domain'),
+               ('frequency', hrv_frequencydomain, 'Frequency-domain'),
+               ('non-linear', hrv_nonlinear, 'Non-linear'))
+
+    return tuple(d for d in domains if parameters in ('auto', 'all', d[0]))
+
+
+def _as_rri(rri):
+    """Converts an RRI sequence to a float64 array, without copying it if it
+    already is one.
+
+    Parameters
+    ----------
+    rri : list, array
+        RR-intervals (ms).
+
+    Returns
+    -------
+    rri : array
+        RR-intervals (ms).
+    """
+
+    return np.asarray(rri, dtype=np.float64)
+
+
 def compute_rri(rpeaks, sampling_rate=1000., filter_rri=True, show=False):
     """Computes RR intervals in milliseconds from a list of R-peak indexes.
 
@@ -235,7 +272,7 @@ def compute_rri(rpeaks, sampling_rate=1000., filter_rri=True, show=False):
     """
 
     # ensure input format
-    rpeaks = np.array(rpeaks)
+    rpeaks = np.asarray(rpeaks)
 
     # difference of R-peaks converted to ms
     rri = (1000. * np.diff(rpeaks)) / sampling_rate
@@ -245,8 +282,8 @@ def compute_rri(rpeaks, sampling_rate=1000., filter_rri=True, show=False):
         rri = rri_filter(rri)
 
     # check if rri is within physiological parameters
-    if rri.min() < 400 or rri.min() > 1400:
-        warnings.warn("RR-intervals appear to be out of normal parameters."
+    if rri.min() < 400 or rri.max() > 1400:
+        warnings.warn("RR-intervals appear to be out of normal parameters. "
                       "Check input values.")
 
     if show:
@@ -272,10 +309,10 @@ def rri_filter(rri=None, threshold=1200):
     """
 
     # ensure input format
-    rri = np.array(rri, dtype=float)
+    rri = _as_rri(rri)
 
     # filter rri values
-    rri_filt = rri[np.where(rri < threshold)]
+    rri_filt = rri[rri < threshold]
 
     return rri_filt
 
@@ -301,7 +338,7 @@ def rri_correction(rri=None, threshold=250):
     if rri is None:
         raise ValueError("Please specify an RRI list or array.")
 
-    # ensure input format
+    # ensure input format (copy, artifacts are replaced in place)
     rri = np.array(rri, dtype=float)
 
     # compute local average
@@ -327,8 +364,9 @@ def hrv_timedomain(rri, duration=None, detrend_rri=True, show=False, **kwargs):
         RR-intervals (ms).
     duration : int, optional
         Duration of the signal (s).
-    detrend_rri : bool, optional
-        Whether to detrend the input signal.
+    detrend_rri : bool, str, optional
+        Whether to detrend the input signal, and with which method (True,
+        'spa' or 'linear', see detrend_window).
     show : bool, optional
         Controls the plotting calls. Default: False.
 
@@ -377,14 +415,14 @@ def hrv_timedomain(rri, duration=None, detrend_rri=True, show=False, **kwargs):
         raise ValueError("Please specify an RRI list or array.")
 
     # ensure numpy
-    rri = np.array(rri, dtype=float)
+    rri = _as_rri(rri)
 
     # detrend
     if detrend_rri:
         if 'rri_detrended' in kwargs:
             rri_det = kwargs['rri_detrended']
         else:
-            rri_det = detrend_window(rri)['rri_det']
+            rri_det = detrend_window(rri, method=detrend_rri)['rri_det']
         print('Time domain: the rri sequence was detrended.')
     else:
         rri_det = rri
@@ -404,10 +442,10 @@ def hrv_timedomain(rri, duration=None, detrend_rri=True, show=False, **kwargs):
 
     if duration >= 10:
         # compute heart rate features
-        hr = 60 / (rri / 1000)  # bpm
+        hr = 60000. / rri  # bpm
         hr_min = hr.min()
         hr_max = hr.max()
-        hr_minmax = hr.max() - hr.min()
+        hr_minmax = hr_max - hr_min
         hr_mean = hr.mean()
         hr_median = np.median(hr)
 
@@ -418,7 +456,7 @@ def hrv_timedomain(rri, duration=None, detrend_rri=True, show=False, **kwargs):
         # compute RRI features
         rr_min = rri.min()
         rr_max = rri.max()
-        rr_minmax = rri.max() - rri.min()
+        rr_minmax = rr_max - rr_min
         rr_mean = rri.mean()
         rr_median = np.median(rri)
         rmssd = (rri_diff ** 2).mean() ** 0.5
@@ -431,7 +469,7 @@ def hrv_timedomain(rri, duration=None, detrend_rri=True, show=False, **kwargs):
         # compute NN50 and pNN50
         th50 = 50
         nntot = len(rri_diff)
-        nn50 = len(np.argwhere(abs(rri_diff) > th50))
+        nn50 = int(np.count_nonzero(np.abs(rri_diff) > th50))
         pnn50 = 100 * (nn50 / nntot)
 
         out = out.append([nn50, pnn50], ['nn50', 'pnn50'])
@@ -466,8 +504,9 @@ def hrv_frequencydomain(rri=None, duration=None, freq_method='FFT',
         Method for spectral estimation. If 'FFT' uses Welch's method.
     fbands : dict, optional
         Dictionary specifying the desired HRV frequency bands.
-    detrend_rri : bool, optional
-        Whether to detrend the input signal. Default: True.
+    detrend_rri : bool, str, optional
+        Whether to detrend the input signal, and with which method (True,
+        'spa' or 'linear', see detrend_window). Default: True.
     show : bool, optional
         Whether to show the power spectrum plot. Default: False.
     kwargs : dict, optional
@@ -506,7 +545,7 @@ def hrv_frequencydomain(rri=None, duration=None, freq_method='FFT',
         fbands = FBANDS
 
     # ensure numpy
-    rri = np.array(rri, dtype=float)
+    rri = _as_rri(rri)
 
     # ensure minimal duration
     if duration is None:
@@ -524,13 +563,13 @@ def hrv_frequencydomain(rri=None, duration=None, freq_method='FFT',
     frs = kwargs['frs'] if 'frs' in kwargs else 4
     t = np.cumsum(rri)
     t -= t[0]
-    rri_inter = interp1d(t, rri, 'cubic')
     t_inter = np.arange(t[0], t[-1], 1000. / frs)
-    rri_inter = rri_inter(t_inter)
+    rri_inter = CubicSpline(t, rri, bc_type='not-a-knot',
+                            extrapolate=False)(t_inter)
 
     # detrend
     if detrend_rri:
-        rri_inter = detrend_window(rri_inter)['rri_det']
+        rri_inter = detrend_window(rri_inter, method=detrend_rri)['rri_det']
         print('Frequency domain: the rri sequence was detrended.')
 
     if duration >= 20:
@@ -538,10 +577,10 @@ def hrv_frequencydomain(rri=None, duration=None, freq_method='FFT',
         # compute frequencies and powers
         if freq_method == 'FFT':
             nperseg = kwargs['nperseg'] if 'nperseg' in kwargs else int(len(rri_inter)/4.5)
-            nfft = kwargs['nfft'] if 'nfft' in kwargs else (256 if nperseg < 256 else 2**np.ceil(np.log(nperseg)/np.log(2)))
+            nfft = kwargs['nfft'] if 'nfft' in kwargs else max(256, 1 << (int(nperseg) - 1).bit_length())
 
-            frequencies, powers = welch(rri_inter, fs=frs, scaling='density',
-                                        nperseg=nperseg, nfft=nfft)
+            frequencies, powers = _welch(rri_inter, fs=frs, scaling='density',
+                                         nperseg=nperseg, nfft=nfft)
 
             # add to output
             out = out.append([frequencies, powers, freq_method],
@@ -576,7 +615,8 @@ def hrv_frequencydomain(rri=None, duration=None, freq_method='FFT',
     return out
 
 
-def hrv_nonlinear(rri=None, duration=None, detrend_rri=True, show=False):
+def hrv_nonlinear(rri=None, duration=None, detrend_rri=True, show=False,
+                  **kwargs):
     """Computes the non-linear HRV features from a sequence of RR intervals.
 
     Parameters
@@ -585,10 +625,14 @@ def hrv_nonlinear(rri=None, duration=None, detrend_rri=True, show=False):
         RR-intervals (ms).
     duration : int, optional
         Duration of the signal (s).
-    detrend_rri : bool, optional
-        Whether to detrend the input signal. Default: True.
+    detrend_rri : bool, str, optional
+        Whether to detrend the input signal, and with which method (True,
+        'spa' or 'linear', see detrend_window). Default: True.
     show : bool, optional
         Controls the plotting calls. Default: False.
+    kwargs : dict, optional
+        rri_detrended : Detrended RR-interval sequence (ms), to avoid
+        detrending the input signal again.
 
     Returns
     -------
@@ -614,7 +658,7 @@ def hrv_nonlinear(rri=None, duration=None, detrend_rri=True, show=False):
         raise TypeError("Please specify an RRI list or array.")
 
     # ensure numpy
-    rri = np.array(rri, dtype=float)
+    rri = _as_rri(rri)
 
     # check duration
     if duration is None:
@@ -626,29 +670,62 @@ def hrv_nonlinear(rri=None, duration=None, detrend_rri=True, show=False):
 
     # detrend
     if detrend_rri:
-        rri = detrend_window(rri)['rri_det']
+        if kwargs.get('rri_detrended') is not None:
+            rri = _as_rri(kwargs['rri_detrended'])
+        else:
+            rri = detrend_window(rri, method=detrend_rri)['rri_det']
         print('Non-linear domain: the rri sequence was detrended.')
 
     # initialize outputs
     out = utils.ReturnTuple((), ())
 
+    # single precision sequence and templates shared by the entropy features
+    rri_sp = np.ascontiguousarray(rri, dtype=np.float32)
+    windows = _entropy_windows(rri_sp, (2, 3))
+
     if duration >= 90:
         # compute SD1, SD2, SD1/SD2 and S
         cp = compute_poincare(rri=rri, show=show)
         out = out.join(cp)
 
         # compute sample entropy
-        sampen = sample_entropy(rri)
+        sampen = sample_entropy(rri_sp, windows=windows)
         out = out.append(sampen, 'sampen')
 
     if len(rri) >= 800 or duration == np.inf:
         # compute approximate entropy
-        appen = approximate_entropy(rri)
+        appen = approximate_entropy(rri_sp, windows=windows)
         out = out.append(appen, 'appen')
 
     return out
 
 
+def _welch(x, **kwargs):
+    """Welch's power spectral density estimate, computing the FFTs with
+    pyFFTW when it is installed.
+
+    Parameters
+    ----------
+    x : array
+        Input signal.
+    kwargs : dict, optional
+        Parameters passed to scipy.signal.welch.
+
+    Returns
+    -------
+    frequencies : array
+        Frequency axis.
+    powers : array
+        Power spectral density.
+    """
+
+    if pyfftw is None:
+        return welch(x, **kwargs)
+
+    with set_backend(pyfftw.interfaces.scipy_fft):
+        return welch(x, **kwargs)
+
+
 def compute_fbands(frequencies, powers, fbands=None, method_name=None,
                    show=False):
     """Computes frequency domain features for the specified frequency bands.
@@ -656,7 +733,7 @@ def compute_fbands(frequencies, powers, fbands=None, method_name=None,
     Parameters
     ----------
     frequencies : array
-        Frequency axis.
+        Frequency axis, in ascending order.
     powers : array
         Power spectrum values for the frequency axis.
     fbands : dict, optional
@@ -685,16 +762,25 @@ def compute_fbands(frequencies, powers, fbands=None, method_name=None,
     if fbands is None:
         fbands = FBANDS
 
-    # compute power, peak and relative power for each frequency band
-    for fband in fbands.keys():
-        band = np.argwhere((frequencies >= fbands[fband][0]) & (frequencies <= fbands[fband][-1])).reshape(-1)
+    # index range of each frequency band in the (sorted) frequency axis
+    names = list(fbands.keys())
+    limits = np.array([[fbands[fband][0], fbands[fband][-1]]
+                       for fband in names]).reshape(-1, 2)
+    start = np.searchsorted(frequencies, limits[:, 0], side='left')
+    stop = np.searchsorted(frequencies, limits[:, 1], side='right')
+
+    # compute the power of all frequency bands at once
+    edges = np.column_stack((start, stop)).reshape(-1)
+    band_pwr = np.add.reduceat(np.append(powers, 0), edges)[::2] * df
 
+    # compute power, peak and relative power for each frequency band
+    for i, fband in enumerate(names):
         # check if it's possible to compute the frequency band
-        if len(band) == 0:
+        if stop[i] <= start[i]:
             continue
 
-        pwr = np.sum(powers[band]) * df
-        peak = frequencies[band][np.argmax(powers[band])]
+        pwr = band_pwr[i]
+        peak = frequencies[start[i] + np.argmax(powers[start[i]:stop[i]])]
         rpwr = pwr / total_pwr
 
         out = out.append([pwr, peak, rpwr], [fband + '_pwr', fband + '_peak',
@@ -749,11 +835,10 @@ def compute_poincare(rri, show=False):
     x = rri[:-1]
     y = rri[1:]
 
-    # compute SD1, SD2 and S
-    x1 = (x - y) / np.sqrt(2)
-    x2 = (x + y) / np.sqrt(2)
-    sd1 = x1.std()
-    sd2 = x2.std()
+    # compute SD1, SD2 and S, using var(x - y) + var(x + y) =
+    # 2 * (var(x) + var(y)) to avoid building the rotated coordinates
+    sd1 = np.diff(rri).std() / np.sqrt(2)
+    sd2 = np.sqrt(max(x.var() + y.var() - sd1 ** 2, 0.))
     s = np.pi * sd1 * sd2
 
     # compute sd1/sd2 and sd2/sd1 ratio
@@ -803,11 +888,25 @@ def compute_geometrical(rri, binsize=1/128, show=False):
     tmin = rri.min()
     tmax = rri.max()
     bins = np.arange(tmin, tmax + binsize, binsize)
-    nn_hist = np.histogram(rri, bins)
+    nbins = len(bins) - 1
+
+    if len(rri) <= 2000:
+        # the bins are uniform, so compute the bin of each RRI directly
+        # instead of searching the bin edges, correcting for rounding at the
+        # edges; as in np.histogram, RRIs beyond the last edge are dropped
+        rri_bin = rri[rri <= bins[-1]]
+        idx = np.minimum(((rri_bin - tmin) / binsize).astype(np.intp),
+                         nbins - 1)
+        idx[rri_bin < bins[idx]] -= 1
+        idx[(rri_bin >= bins[idx + 1]) & (idx < nbins - 1)] += 1
+        counts = np.bincount(idx, minlength=nbins)
+    else:
+        # np.histogram is faster for long sequences
+        counts = np.histogram(rri, bins)[0]
 
     # histogram peak
-    max_count = np.max(nn_hist[0])
-    peak_hist = np.argmax(nn_hist[0])
+    max_count = np.max(counts)
+    peak_hist = np.argmax(counts)
 
     # compute HTI
     hti = len(rri) / max_count
@@ -817,26 +916,28 @@ def compute_geometrical(rri, binsize=1/128, show=False):
     m_values = bins[peak_hist + 1:]
 
     # find triangle with base N and M that best approximates the distribution
-    error_min = np.inf
     n = 0
     m = 0
     q_hist = None
 
-    for n_ in n_values:
+    if len(n_values) > 0:
+        peak = bins[peak_hist]
 
-        for m_ in m_values:
+        # triangle sides at the bin edges, for each possible N and M
+        q_left = max_count * np.clip((bins[:peak_hist + 1] - n_values[:, None])
+                                     / (peak - n_values[:, None]), 0, 1)
+        q_right = max_count * np.clip((m_values[:, None] - bins[peak_hist + 1:])
+                                      / (m_values[:, None] - peak), 0, 1)
 
-            t = np.array([tmin, n_, nn_hist[1][peak_hist], m_, tmax + binsize])
-            y = np.array([0, 0, max_count, 0, 0])
-            q = interp1d(x=t, y=y, kind='linear')
-            q = q(bins)
+        # the sum of squared differences splits into a term depending only on
+        # N (bins up to the peak) and a term depending only on M
+        error_n = np.sum((counts[:peak_hist + 1] - q_left) ** 2, axis=1)
+        error_m = np.sum((counts[peak_hist + 1:] - q_right[:, :-1]) ** 2, axis=1)
+        error = error_n[:, None] + error_m[None, :]
 
-            # compute the sum of squared differences
-            error = np.sum((nn_hist[0] - q[:-1]) ** 2)
-
-            if error < error_min:
-                error_min = error
-                n, m, q_hist = n_, m_, q
+        i, j = np.unravel_index(np.argmin(error), error.shape)
+        n, m = n_values[i], m_values[j]
+        q_hist = np.concatenate((q_left[i], q_right[j]))
 
     # compute TINN
     tinn = m - n
@@ -857,7 +958,7 @@ def compute_geometrical(rri, binsize=1/128, show=False):
     return out
 
 
-def detrend_window(rri, win_len=2000, **kwargs):
+def detrend_window(rri, win_len=None, method='spa', **kwargs):
     """Facilitates RRI detrending method using a signal window.
 
     Parameters
@@ -865,9 +966,15 @@ def detrend_window(rri, win_len=2000, **kwargs):
     rri : array
         RR-intervals (ms).
     win_len : int, optional
-        Length of the window to detrend the RRI signal. Default: 2000.
+        Length of the window to detrend the RRI signal with smoothness priors.
+        If None, the whole signal is detrended at once. Default: None.
+    method : str, optional
+        Detrending method. If 'spa' (or any non-string value, such as True)
+        uses smoothness priors. If 'linear' removes the least-squares linear
+        fit of the whole signal. Default: 'spa'.
     kwargs : dict, optional
-        Parameters of the detrending method.
+        Parameters of the detrending method. n_jobs sets the number of
+        threads used to detrend the windows (default: -1, all cores).
 
     Returns
     -------
@@ -878,26 +985,43 @@ def detrend_window(rri, win_len=2000, **kwargs):
 
     """
 
+    # check inputs (any non-string truthy value selects the default method)
+    if not isinstance(method, str):
+        method = 'spa'
+
+    methods = ['spa', 'linear']
+    if method not in methods:
+        raise ValueError(f"'{method}' is not an available input. Choose one "
+                         f"from: {methods}.")
+
     # check input type
-    win_len = int(win_len)
+    if win_len is not None:
+        win_len = int(win_len)
 
     # extract parameters
     smoothing_factor = kwargs['smoothing_factor'] if 'smoothing_factor' in kwargs else 500
+    n_jobs = kwargs['n_jobs'] if 'n_jobs' in kwargs else -1
 
     # detrend signal
-    if len(rri) > win_len:
-        # split the signal
-        splits = int(len(rri)/win_len)
-        rri_splits = np.array_split(rri, splits)
-
-        # compute the detrended signal for each split
-        rri_det = []
-        for split in rri_splits:
-            split_det = st.detrend_smoothness_priors(split, smoothing_factor)['detrended']
-            rri_det.append(split_det)
+    if method == 'linear':
+        rri = _as_rri(rri)
+        rri_det = detrend(rri, type='linear')
+        rri_trend = rri - rri_det
+    elif win_len is not None and len(rri) > win_len:
+        # split the signal in windows of win_len samples (views), appending
+        # the remaining samples to the last window
+        rri = _as_rri(rri)
+        tail = (len(rri) // win_len - 1) * win_len
+        rri_splits = list(rri[:tail].reshape(-1, win_len))
+        rri_splits.append(rri[tail:])
+
+        # compute the detrended signal for each split in parallel
+        rri_det = Parallel(n_jobs=n_jobs, prefer='threads')(
+            delayed(st.detrend_smoothness_priors)(split, smoothing_factor)
+            for split in rri_splits)
 
         # concantenate detrended splits
-        rri_det = np.concatenate(rri_det)
+        rri_det = np.concatenate([split_det['detrended'] for split_det in rri_det])
         rri_trend = None
     else:
         rri_det, rri_trend = st.detrend_smoothness_priors(rri, smoothing_factor)
@@ -907,7 +1031,101 @@ def detrend_window(rri, win_len=2000, **kwargs):
     return out
 
 
-def sample_entropy(rri, m=2, r=0.2):
+def _entropy_windows(rri, lengths):
+    """Builds views of all the templates of an RRI sequence, to be shared
+    between the entropy features.
+
+    The sequence is only copied if it is not already a contiguous float32
+    array, as used by the entropy features.
+
+    Parameters
+    ----------
+    rri : array
+        RR-intervals (ms).
+    lengths : list
+        Template lengths.
+
+    Returns
+    -------
+    windows : dict
+        Templates with shape (len(rri) - length + 1, length), keyed by length,
+        as views of the float32 sequence.
+    """
+
+    rri = np.ascontiguousarray(rri, dtype=np.float32)
+
+    return {m: np.lib.stride_tricks.sliding_window_view(rri, m)
+            for m in lengths}
+
+
+def _match_blocks(x_i, x_j, r, max_bytes=2**18):
+    """Finds, in row blocks sized to fit the L2 cache, the templates in x_j
+    within a Chebyshev distance r of each template in x_i, avoiding the full
+    pairwise distance matrix.
+
+    Parameters
+    ----------
+    x_i : array
+        Templates to match, with shape (n_i, m).
+    x_j : array
+        Templates to match against, with shape (n_j, m).
+    r : float
+        Tolerance.
+    max_bytes : int, optional
+        Maximum size of each distance block (bytes). Default: 256 kB.
+
+    Yields
+    ------
+    i0, i1 : int
+        Range of the templates of x_i in the block.
+    match : array
+        Boolean matches between x_i[i0:i1] and x_j.
+    """
+
+    n_i, m = x_i.shape
+    block = max(1, max_bytes // (len(x_j) * x_j.itemsize))
+
+    # one contiguous row per template coordinate
+    x_j = np.ascontiguousarray(x_j.T)
+
+    for i0 in range(0, n_i, block):
+        i1 = min(i0 + block, n_i)
+
+        # Chebyshev distance, accumulated over the template coordinates
+        d = np.abs(x_i[i0:i1, 0, None] - x_j[0])
+        for k in range(1, m):
+            np.maximum(d, np.abs(x_i[i0:i1, k, None] - x_j[k]), out=d)
+
+        yield i0, i1, d <= r
+
+
+def _count_matches(x_i, x_j, r):
+    """Counts, for each template in x_i, the templates in x_j within a
+    Chebyshev distance r.
+
+    Parameters
+    ----------
+    x_i : array
+        Templates to match, with shape (n_i, m).
+    x_j : array
+        Templates to match against, with shape (n_j, m).
+    r : float
+        Tolerance.
+
+    Returns
+    -------
+    counts : array
+        Number of matches for each template in x_i.
+    """
+
+    counts = np.empty(len(x_i), dtype=int)
+    for i0, i1, match in _match_blocks(x_i, x_j, r):
+        counts[i0:i1] = np.count_nonzero(match, axis=1)
+
+    return counts
+
+
+def sample_entropy(rri, m=2, r=0.2, windows=None):
     """Computes the sample entropy of an RRI sequence.
 
     Parameters
@@ -919,6 +1137,9 @@ def sample_entropy(rri, m=2, r=0.2):
     r : int, float, optional
         Tolerance. It is then multiplied by the sequence standard deviation.
         Default: 0.2.
+    windows : dict, optional
+        Templates of the RRI sequence, as returned by _entropy_windows, keyed
+        by length. Must include length m.
 
     Returns
     -------
@@ -931,28 +1152,43 @@ def sample_entropy(rri, m=2, r=0.2):
     """
 
     # redefine r
-    r = r * rri.std()
+    r = np.float32(r * np.std(rri, dtype=np.float64))
+
+    # single precision is enough for the template distances (no copy if the
+    # sequence already is single precision)
+    rri = np.asarray(rri, dtype=np.float32)
 
     n = len(rri)
 
-    # Split time series and save all templates of length m
-    xmi = np.array([rri[i: i + m] for i in range(n - m)])
-    xmj = np.array([rri[i: i + m] for i in range(n - m + 1)])
+    # all templates of length m
+    if windows is None:
+        windows = _entropy_windows(rri, (m,))
+    xm = windows[m]
+
+    # last coordinate of the templates of length m + 1
+    xm_next = rri[m:]
 
-    # Save all matches minus the self-match, compute B
-    b = np.sum([np.sum(np.abs(xmii - xmj).max(axis=1) <= r) - 1 for xmii in xmi])
+    a = 0
+    b = 0
+    for i0, i1, match in _match_blocks(xm[:n - m], xm, r):
+        # Save all matches, compute B
+        b += np.count_nonzero(match)
 
-    # Similar for computing A
-    m += 1
-    xm = np.array([rri[i: i + m] for i in range(n - m + 1)])
+        # templates of length m + 1 match if their length m templates match
+        # and so does the extra coordinate, compute A
+        match = match[:, :n - m]
+        match &= np.abs(xm_next[i0:i1, None] - xm_next) <= r
+        a += np.count_nonzero(match)
 
-    a = np.sum([np.sum(np.abs(xmi - xm).max(axis=1) <= r) - 1 for xmi in xm])
+    # remove the self-matches
+    a -= n - m
+    b -= n - m
 
     # Return SampEn
     return -np.log(a / b)
 
 
-def approximate_entropy(rri, m=2, r=0.2):
+def approximate_entropy(rri, m=2, r=0.2, windows=None):
     """Computes the approximate entropy of an RRI sequence.
 
     Parameters
@@ -964,6 +1200,10 @@ def approximate_entropy(rri, m=2, r=0.2):
     r : int, float, optional
         Tolerance. It is then multiplied by the sequence standard deviation.
         Default: 0.2.
+    windows : dict, optional
+        Templates of the RRI sequence, as returned by _entropy_windows, keyed
+        by length. Must include lengths m and m + 1. Only used without numba,
+        as the compiled kernel reads the sequence directly.
 
     Returns
     -------
@@ -976,19 +1216,77 @@ def approximate_entropy(rri, m=2, r=0.2):
     """
 
     # redefine r
-    r = r * rri.std()
+    r = np.float32(r * np.std(rri, dtype=np.float64))
+
+    # single precision is enough for the template distances (no copy if the
+    # sequence already is single precision)
+    rri = np.asarray(rri, dtype=np.float32)
 
-    def _maxdist(x_i, x_j):
-        return max([abs(ua - va) for ua, va in zip(x_i, x_j)])
+    # use the compiled kernel if numba is available; on a single thread it is
+    # only faster than the blocked numpy implementation for short sequences
+    if njit is not None:
+        n_threads = get_num_threads()
+        if n_threads > 1 or len(rri) <= 2000:
+            return (_phi_numba(rri, m, r, n_threads)
+                    - _phi_numba(rri, m + 1, r, n_threads))
+
+    if windows is None:
+        windows = _entropy_windows(rri, (m, m + 1))
 
     def _phi(m):
-        x = [[rri[j] for j in range(i, i + m - 1 + 1)] for i in range(n - m + 1)]
-        C = [
-            len([1 for x_j in x if _maxdist(x_i, x_j) <= r]) / (n - m + 1.0)
-            for x_i in x
-        ]
-        return (n - m + 1.0) ** (-1) * sum(np.log(C))
+        x = windows[m]
+        C = _count_matches(x, x, r) / (n - m + 1.0)
+        return np.mean(np.log(C))
 
     n = len(rri)
 
     return _phi(m) - _phi(m + 1)
+
+
+if njit is not None:
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _phi_numba(rri, m, r, n_threads):
+        """Computes the approximate entropy phi term for templates of
+        length m, comparing each pair of templates only once.
+
+        Each thread takes an interleaved set of rows of the upper triangle,
+        which balances the work, and accumulates the matches of both templates
+        of a pair in its own counts row.
+
+        Parameters
+        ----------
+        rri : array
+            RR-intervals (ms).
+        m : int
+            Template length.
+        r : float
+            Tolerance.
+        n_threads : int
+            Number of threads.
+
+        Returns
+        -------
+        phi : float
+            Average log-frequency of template matches.
+        """
+
+        n = len(rri) - m + 1
+        counts = np.zeros((n_threads, n), dtype=np.int64)
+
+        for t in prange(n_threads):
+            c = counts[t]
+            for i in range(t, n, n_threads):
+                # self-match
+                c[i] += 1
+
+                for j in range(i + 1, n):
+                    # Chebyshev distance
+                    d = abs(rri[i] - rri[j])
+                    for k in range(1, m):
+                        d = max(d, abs(rri[i + k] - rri[j + k]))
+
+                    if d <= r:
+                        c[i] += 1
+                        c[j] += 1
+
+        return np.log(counts.sum(axis=0) / n).sum() / n
@@ -18,12 +18,14 @@ import six
 
 # 3rd party
 import sys
+from functools import lru_cache
 import numpy as np
 import scipy.signal as ss
 from scipy.signal import windows as ssw
 from scipy import interpolate, optimize
 from scipy.stats import stats
-from scipy.sparse import spdiags, eye, csr_matrix
+from scipy.sparse import spdiags, eye
+from scipy.sparse.linalg import splu
 
 
 # local
@@ -2216,10 +2218,40 @@ def median_waves(data=None, size=None, step=None):
     return utils.ReturnTuple((waves,), ("waves",))
 
 
+@lru_cache(maxsize=8)
+def _smoothness_priors_lu(size, smoothing_factor):
+    """LU factorization of the sparse banded smoothness priors system
+    (I + lambda^2 * D2'D2), cached per signal length and smoothing factor.
+
+    Parameters
+    ----------
+    size : int
+        Length of the signal.
+    smoothing_factor : int, float
+        Smoothing parameter lambda.
+
+    Returns
+    -------
+    lu : scipy.sparse.linalg.SuperLU
+        Factorized system.
+
+    """
+
+    # second order difference matrix (D2)
+    aux = np.dot(np.ones((size, 1)), np.array([[1, -2, 1]]))
+    d2 = spdiags(aux.T, [0, 1, 2], size - 2, size)
+
+    system = eye(size) + smoothing_factor ** 2 * d2.T * d2
+
+    return splu(system.tocsc())
+
+
 def detrend_smoothness_priors(signal, smoothing_factor=10):
     """ Detrending method based on smoothness priors applied to HRV signal analysis.
 
-    Follows the approach by Tarvainen et al. [Tarivainen2002].
+    Follows the approach by Tarvainen et al. [Tarivainen2002]. The trend is
+    obtained by solving the sparse banded regularized system instead of
+    inverting it, which scales linearly with the signal length.
 
     Parameters
     ----------
@@ -2244,21 +2276,13 @@ def detrend_smoothness_priors(signal, smoothing_factor=10):
 
     """
 
-    # variables
-    t = len(signal)
-    identity = eye(t)
-
-    # first computation (D2)
-    aux1 = np.dot(np.ones((t, 1)), np.array([[1, -2, 1]]))
-    d2 = spdiags(aux1.T, [0, 1, 2], t-2, t)
+    # ensure numpy
+    signal = np.asarray(signal, dtype=float)
 
-    # second computation (z_stat)
-    aux2 = smoothing_factor ** 2 * d2.T * d2
-    inv = np.linalg.inv(csr_matrix(identity) + aux2.todense())
-    z_stat = csr_matrix(identity - inv) * signal
+    # solve (I + lambda^2 * D2'D2) z_trend = signal
+    z_trend = _smoothness_priors_lu(len(signal), smoothing_factor).solve(signal)
 
     # detrending
-    z_trend = np.asarray(signal - z_stat)
-    z_detrended = np.array(signal) - z_trend
+    z_detrended = signal - z_trend
 
     return utils.ReturnTuple((z_detrended.T, z_trend.T), ('detrended', 'trend'))
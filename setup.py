@@ -40,7 +40,7 @@ REQUIRED = [
     'scipy',
     'shortuuid',
     'six',
-    'joblib',
+    'joblib>=0.12',
     'opencv-python',
     'pywavelets',
     'mock',
@@ -49,6 +49,7 @@ REQUIRED = [
 # What packages are optional?
 EXTRAS = {
     'eda': ['cvxopt'],
+    'hrv': ['numba', 'pyfftw'],
     # 'fancy feature': ['django'],
 }
 